@@ -1,6 +1,9 @@
 import sqlite3 as sql
+from contextlib import contextmanager
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 
 
 class Database:
@@ -16,41 +19,253 @@ class Database:
         url (string): Database URL
         """
         self.url = url
-        self.conn = sql.connect(url)
+        # Transactions are controlled explicitly, see transaction()
+        self.conn = sql.connect(url, isolation_level=None, check_same_thread=False)
 
-    def to_sql(self, df, table, if_exists='append'):
+        # Tune SQLite for bulk load. WAL is not supported for in-memory databases.
+        if url != ':memory:':
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self.conn.execute('PRAGMA cache_size=-131072')
+        self.conn.execute('PRAGMA mmap_size=268435456')
+
+        # Cursor reused by execute()
+        self._cur = self.conn.cursor()
+
+    def close(self):
+        """
+        Closes database connection
         """
-        Wrapper for Pandas to_sql() method to store DataFrame in database table
+        self._cur.close()
+        self.conn.close()
+
+    def to_sql(self, df, table, if_exists='append', chunksize=1000, method='multi'):
+        """
+        Stores DataFrame in database table. Appending to existing table is done
+        using executemany(), otherwise falls back to Pandas to_sql() method.
+        The fallback commits on its own, so it is not allowed inside transaction.
 
         Parameters:
         df (DataFrame):     Pandas DataFrame
         table (str):        Table name
         if_exists (str):    What to do if table exists. Append data by default.
+        chunksize (int):    Number of rows written per batch by Pandas
+        method (str):       Pandas insertion method. Multi-row INSERT by default.
         """
-        df.to_sql(table, self.conn, if_exists=if_exists, index=False)
+        if if_exists == 'append' and self.table_exists(table):
+            self._fast_insert(df, table)
+            return
+
+        # Pandas to_sql() commits open transaction which would break transaction() rollback
+        if self.conn.in_transaction:
+            raise RuntimeError(f'Cannot create or replace table {table} inside transaction')
 
-    def read_sql(self, s):
+        # Keep multi-row INSERT under SQLite limit of 999 parameters per statement
+        if method == 'multi' and len(df.columns) > 0:
+            chunksize = min(chunksize, max(1, 900 // len(df.columns)))
+
+        with self._autocommit():
+            df.to_sql(table, self.conn, if_exists=if_exists, index=False,
+                      chunksize=chunksize, method=method)
+
+    def _fast_insert(self, df, table):
         """
-        Wrapper for Pandas read_sql() method to execute SQL and return Pandas DataFrame as result
+        Appends DataFrame rows to existing table using DB-API executemany()
 
         Parameters:
-        s (str):    SQL to execute
+        df (DataFrame):     Pandas DataFrame
+        table (str):        Table name
+        """
+        # sqlite3 cannot bind Pandas Timestamp, so datetime columns are stored as ISO strings
+        # in the same format as Pandas to_sql() does
+        datetime_cols = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+        if len(datetime_cols) > 0:
+            df = df.copy()
+            for c in datetime_cols:
+                df[c] = [None if pd.isna(v) else v.isoformat(' ') for v in df[c]]
+
+        # Missing values (NaN, NaT, pd.NA of nullable dtypes) are stored as NULL
+        df = df.astype(object).where(df.notna(), None)
+
+        with self._autocommit():
+            self._insert_rows(table, df.columns, df.itertuples(index=False, name=None))
+
+    def insert_parquet(self, path, table, batch_size=50000):
+        """
+        Appends Parquet data to existing table. Data is read with PyArrow batch by batch
+        so Spark Session is not required.
+
+        Parameters:
+        path (str):         Parquet file or folder path
+        table (str):        Table name
+        batch_size (int):   Max number of rows read per batch
+        """
+        dataset = ds.dataset(path, format='parquet')
+        self._insert_batches(table, dataset.to_batches(batch_size=batch_size))
+
+    def _insert_batches(self, table, batches):
+        """
+        Inserts Arrow record batches into table in single transaction
+
+        Parameters:
+        table (str):            Table name
+        batches (iterable):     PyArrow RecordBatch instances
+        """
+        with self._autocommit():
+            for batch in batches:
+                self._insert_rows(
+                    table,
+                    batch.schema.names,
+                    zip(*[self._arrow_values(c) for c in batch.columns])
+                )
+
+    @staticmethod
+    def _arrow_values(column):
+        """
+        Converts Arrow array into list of values supported by sqlite3. Timestamps are stored
+        as ISO strings in the same format as Pandas to_sql() does.
+
+        Parameters:
+        column (Array):     PyArrow Array
+
+        Returns
+        -------
+        list                Column values
+        """
+        if not pa.types.is_timestamp(column.type):
+            return column.to_pylist()
+
+        # Nanosecond timestamps (e.g. Spark INT96) would be converted to Pandas Timestamp
+        column = column.cast(pa.timestamp('us', column.type.tz), safe=False)
+        return [None if v is None else v.isoformat(' ') for v in column.to_pylist()]
+
+    def _insert_rows(self, table, columns, rows):
+        """
+        Inserts rows into table using DB-API executemany()
+
+        Parameters:
+        table (str):        Table name
+        columns (list):     Column names
+        rows (iterable):    Tuples with column values
+        """
+        cols = ','.join(f'"{c}"' for c in columns)
+        placeholders = ','.join('?' * len(columns))
+        self.conn.executemany(f'INSERT INTO {table} ({cols}) VALUES ({placeholders})', rows)
+
+    def table_exists(self, table):
+        """
+        Checks if table exists in database
+
+        Parameters:
+        table (str):    Table name
+
+        Returns
+        -------
+        bool            True if table exists
+        """
+        cur = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cur.fetchone() is not None
+
+    def begin(self):
+        """
+        Starts transaction. Writes are not committed until commit() is called.
+        """
+        self.conn.execute('BEGIN')
+
+    def commit(self):
+        """
+        Commits current transaction
+        """
+        self.conn.commit()
+
+    def rollback(self):
+        """
+        Rolls back current transaction
+        """
+        self.conn.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block in single transaction. Commits on success and rolls back on error.
+        """
+        self.begin()
+        try:
+            yield self
+        except Exception:
+            self.rollback()
+            raise
+        self.commit()
+
+    @contextmanager
+    def _autocommit(self):
+        """
+        Runs writes done inside the block in own transaction unless one is already open
+        """
+        if self.conn.in_transaction:
+            yield
+        else:
+            with self.transaction():
+                yield
+
+    def read_sql(self, s, chunksize=None):
+        """
+        Executes SQL and returns Pandas DataFrame as result.
+        Result is fetched in chunks to limit peak memory usage.
+
+        Parameters:
+        s (str):            SQL to execute
+        chunksize (int):    If given, return iterator of DataFrames with up to chunksize rows each
 
         Returns
         -------
         DataFrame   Result dataset for given SQL
         """
-        return pd.read_sql(s, self.conn)
+        cur = self.conn.execute(s)
+        columns = [c[0] for c in cur.description]
+        if chunksize is not None:
+            return self._fetch_chunks(cur, columns, chunksize)
+
+        chunks = list(self._fetch_chunks(cur, columns, 50000))
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    @staticmethod
+    def _fetch_chunks(cur, columns, chunksize):
+        """
+        Fetches query result from cursor as Pandas DataFrames in the same way as Pandas read_sql() does
+
+        Parameters:
+        cur (Cursor):       Cursor with executed query
+        columns (list):     Column names
+        chunksize (int):    Max number of rows per DataFrame
+
+        Returns
+        -------
+        iterator            DataFrames with up to chunksize rows each
+        """
+        try:
+            while True:
+                rows = cur.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        finally:
+            cur.close()
 
     def execute(self, s):
         """
         Executes given SQL on database. Normally used for DDL execution.
+        Changes are committed unless transaction was started by begin().
 
         Parameters:
         s (str):    SQL to execute
         """
-        cur = self.conn.cursor()
-        cur.execute(s)
+        with self._autocommit():
+            self._cur.execute(s)
 
 
 class Posts:
@@ -152,7 +367,15 @@ class PostsTags:
 
     def create(self):
         """
-        Recreates posts_tags table in database.
+        Recreates posts_tags table in database together with its indices.
+        """
+        self.create_table()
+        self.create_indices()
+
+    def create_table(self):
+        """
+        Recreates posts_tags table in database without indices.
+        Used for bulk load, call create_indices() once data is inserted.
         """
         self.db.execute('DROP TABLE IF EXISTS posts_tags')
         self.db.execute('''
@@ -162,7 +385,12 @@ class PostsTags:
                 TagId   INTEGER NOT NULL,
                 TagName TEXT NOT NULL,
                 FOREIGN KEY (PostId) REFERENCES posts (Id),
-                FOREIGN KEY (TagId) REFERENCES tags (Id),
-                UNIQUE(PostId,TagId)
+                FOREIGN KEY (TagId) REFERENCES tags (Id)
             )
         ''')
+
+    def create_indices(self):
+        """
+        Creates indices for posts_tags table.
+        """
+        self.db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_tags ON posts_tags (PostId, TagId)')
@@ -1,11 +1,24 @@
 import os
+import sqlite3
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
 
 import db as sql
 
 db_url = 'test' + os.sep + 'warehouse.db'
-db = sql.Database(db_url)
+db = None
+
+
+def setup_module():
+    global db
+    db = sql.Database(db_url)
+
+
+def teardown_module():
+    db.close()
 
 
 def run_sql(s):
@@ -20,6 +33,8 @@ def create_test_tab():
 def test_database():
     assert db.url == db_url
     assert list(run_sql('SELECT 1')) == [(1,)]
+    assert list(run_sql('PRAGMA journal_mode')) == [('wal',)]
+    assert list(run_sql('PRAGMA synchronous')) == [(1,)]
 
 
 def test_to_sql():
@@ -29,17 +44,129 @@ def test_to_sql():
     assert list(run_sql('SELECT * FROM test')) == [(1,), (2,)]
 
 
+def test_to_sql_chunks():
+    # New table is written by Pandas with multi-row INSERT, 40 columns need chunks of 22 rows
+    run_sql('DROP TABLE IF EXISTS test_wide')
+    df = pd.DataFrame([[r] * 40 for r in range(3000)], columns=[f'c{i}' for i in range(40)])
+
+    # Newer SQLite builds allow more parameters, enforce old default limit where possible
+    limit = None
+    if hasattr(db.conn, 'setlimit'):
+        limit = db.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    try:
+        db.to_sql(df, 'test_wide')
+    finally:
+        if limit is not None:
+            db.conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+    assert list(run_sql('SELECT COUNT(*), MAX(c0), MAX(c39) FROM test_wide')) == [(3000, 2999, 2999)]
+
+
+def test_to_sql_datetime():
+    run_sql('DROP TABLE IF EXISTS test_dt')
+    run_sql('CREATE TABLE test_dt (d TIMESTAMP)')
+    df = pd.DataFrame({'d': [pd.Timestamp('2020-01-01 10:00:00'), pd.NaT]})
+    db.to_sql(df, 'test_dt')
+    assert list(run_sql('SELECT * FROM test_dt')) == [('2020-01-01 10:00:00',), (None,)]
+
+
+def test_to_sql_nullable():
+    run_sql('DROP TABLE IF EXISTS test_null')
+    run_sql('CREATE TABLE test_null (i INTEGER, b INTEGER, s TEXT, f REAL)')
+    df = pd.DataFrame({
+        'i': pd.array([1, None], dtype='Int64'),
+        'b': pd.array([True, None], dtype='boolean'),
+        's': pd.array(['x', None], dtype='string'),
+        'f': [1.5, None]
+    })
+    db.to_sql(df, 'test_null')
+    assert list(run_sql('SELECT * FROM test_null')) == [(1, 1, 'x', 1.5), (None, None, None, None)]
+
+
+def test_insert_parquet():
+    create_test_tab()
+    pq.write_table(pa.table({'a': [2, 3, 4]}), 'test' + os.sep + 'test_insert.parquet')
+    db.insert_parquet('test' + os.sep + 'test_insert.parquet', 'test', batch_size=2)
+    assert list(run_sql('SELECT * FROM test')) == [(1,), (2,), (3,), (4,)]
+
+
+def test_insert_parquet_int96():
+    run_sql('DROP TABLE IF EXISTS test_dt')
+    run_sql('CREATE TABLE test_dt (d TIMESTAMP)')
+    # Spark 3.0 writes timestamps as INT96 by default
+    d = pa.array([pd.Timestamp('2020-01-01 10:00:00.5').to_pydatetime(), None], pa.timestamp('us'))
+    pq.write_table(pa.table({'d': d}), 'test' + os.sep + 'test_int96.parquet',
+                   use_deprecated_int96_timestamps=True)
+    db.insert_parquet('test' + os.sep + 'test_int96.parquet', 'test_dt')
+    assert list(run_sql('SELECT * FROM test_dt')) == [('2020-01-01 10:00:00.500000',), (None,)]
+
+
 def test_read_sql():
     create_test_tab()
     assert db.read_sql('SELECT * FROM test').to_dict() == {'a': {0: 1}}
 
 
+def test_read_sql_chunks():
+    create_test_tab()
+    db.to_sql(pd.DataFrame([2, 3], columns=['a']), 'test')
+    chunks = list(db.read_sql('SELECT * FROM test', chunksize=2))
+    assert [len(c) for c in chunks] == [2, 1]
+    empty = db.read_sql('SELECT * FROM test WHERE a > 5')
+    assert empty.empty
+    assert list(empty.columns) == ['a']
+
+
+def test_transaction():
+    create_test_tab()
+    db.begin()
+    db.to_sql(pd.DataFrame([2], columns=['a']), 'test')
+    db.rollback()
+    assert list(run_sql('SELECT * FROM test')) == [(1,)]
+
+    db.begin()
+    db.to_sql(pd.DataFrame([2], columns=['a']), 'test')
+    db.commit()
+    assert list(run_sql('SELECT * FROM test')) == [(1,), (2,)]
+
+
+def test_transaction_context():
+    create_test_tab()
+    with pytest.raises(sqlite3.IntegrityError):
+        with db.transaction():
+            db.execute('CREATE UNIQUE INDEX idx_test ON test (a)')
+            db.to_sql(pd.DataFrame([1], columns=['a']), 'test')
+    assert list(run_sql("SELECT name FROM sqlite_master WHERE name = 'idx_test'")) == []
+
+    with db.transaction():
+        db.to_sql(pd.DataFrame([2], columns=['a']), 'test')
+        db.to_sql(pd.DataFrame([3], columns=['a']), 'test')
+    assert list(run_sql('SELECT * FROM test')) == [(1,), (2,), (3,)]
+
+
+def test_transaction_new_table():
+    create_test_tab()
+    run_sql('DROP TABLE IF EXISTS test_new')
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.to_sql(pd.DataFrame([2], columns=['a']), 'test')
+            db.to_sql(pd.DataFrame([1], columns=['a']), 'test_new')
+    assert not db.table_exists('test_new')
+    assert list(run_sql('SELECT * FROM test')) == [(1,)]
+
+
 def test_execute():
     db.execute('DROP TABLE IF EXISTS test_exec')
     db.execute('CREATE TABLE IF NOT EXISTS test_exec AS SELECT 1 as a')
     assert list(run_sql('SELECT * FROM test_exec')) == [(1,)]
 
 
+def test_close():
+    mem_db = sql.Database(':memory:')
+    mem_db.execute('CREATE TABLE test_close AS SELECT 1 as a')
+    mem_db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        mem_db.execute('SELECT * FROM test_close')
+
+
 def test_create_posts():
     run_sql('DROP TABLE IF EXISTS posts')
     sql.Posts(db).create()
@@ -56,3 +183,15 @@ def test_create_posts_tags():
     run_sql('DROP TABLE IF EXISTS posts_tags')
     sql.PostsTags(db).create()
     assert list(run_sql('SELECT * FROM posts_tags')) == []
+    assert list(run_sql("SELECT name FROM sqlite_master WHERE tbl_name = 'posts_tags' AND type = 'index'")) == [
+        ('idx_posts_tags',)]
+
+
+def test_to_sql_new_table():
+    run_sql('DROP TABLE IF EXISTS test_new')
+    df = pd.DataFrame([[1, 'x'], [2, None]], columns=['a', 'b'])
+    db.to_sql(df, 'test_new')
+    db.to_sql(df, 'test_new')
+    assert list(run_sql('SELECT * FROM test_new')) == [(1, 'x'), (2, None)] * 2
+    db.to_sql(df, 'test_new', if_exists='replace')
+    assert list(run_sql('SELECT * FROM test_new')) == [(1, 'x'), (2, None)]
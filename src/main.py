@@ -2,10 +2,28 @@
 import os
 import sys
 
+import pyspark.sql.functions as f
+
 import db as sql
 import sparkclient as scl
 
 
+def save_and_check(dataset):
+    """
+    Stores posts_tags dataset in Parquet file and runs its Validation Checks.
+    Posts and Tags are stored in Parquet when XML is loaded, so they only need to be checked.
+
+    Parameters:
+    dataset (PostsTags):    PostsTags instance
+
+    Returns
+    -------
+    DataFrame   Spark DataFrame with check results
+    """
+    dataset.save()
+    return dataset.check()
+
+
 def main(path='uncommitted'):
     """
     Entrypoint for XML data load
@@ -23,42 +41,52 @@ def main(path='uncommitted'):
     # Create posts_tags table used to join Posts and Tags
     posts_tags = scl.PostsTags(sc, posts.df, tags.df)
 
-    # Save to Parquet
-    posts.save()
-    tags.save()
-    posts_tags.save()
-
-    # Run Validation Checks
-    checks = (
-        posts.check()
-        .union(tags.check())
-        .union(posts_tags.check())
-    ).toPandas()
+    # Save posts_tags to Parquet and run Validation Checks. Datasets are processed concurrently.
+    # Posts and Tags are already stored in Parquet when XML is loaded.
+    posts_check, tags_check, posts_tags_check = sc.run_concurrently(
+        posts.check,
+        tags.check,
+        lambda: save_and_check(posts_tags)
+    )
+    checks_df = (
+        posts_check
+        .union(tags_check)
+        .union(posts_tags_check)
+    ).cache()
+    failed_count = checks_df.filter(f.col('constraint_status') != 'Success').count()
+    checks = checks_df.toPandas()
+    checks_df.unpersist()
+
+    # Stop Spark Session. Data is loaded into SQLite from Parquet files.
+    posts.df.unpersist()
+    tags.df.unpersist()
+    sc.stop()
 
     # Connect to SQLite DB
     db = sql.Database(path + os.sep + 'warehouse.db')
 
-    # Save Check Results
-    db.to_sql(checks, 'check_results', if_exists='replace')
+    try:
+        # Save Check Results
+        db.to_sql(checks, 'check_results', if_exists='replace')
 
-    # If any check has failed -> exit with error
-    failed = checks[checks['constraint_status'] != 'Success']
-    if len(failed) > 0:
-        sc.stop()
-        sys.exit('Data validation check has failed! See check_results table for more details.')
+        # If any check has failed -> exit with error
+        if failed_count > 0:
+            sys.exit('Data validation check has failed! See check_results table for more details.')
 
-    # Create tables in SQLite
-    sql.Posts(db).create()
-    sql.Tags(db).create()
-    sql.PostsTags(db).create()
+        # Create tables and save data in SQLite in single transaction
+        with db.transaction():
+            sql.Posts(db).create()
+            sql.Tags(db).create()
+            sql.PostsTags(db).create_table()
 
-    # Save data in SQLite
-    db.to_sql(posts.df.toPandas(), 'posts')
-    db.to_sql(tags.df.toPandas(), 'tags')
-    db.to_sql(posts_tags.df.toPandas(), 'posts_tags')
+            db.insert_parquet(sc.parquet_path('posts'), 'posts')
+            db.insert_parquet(sc.parquet_path('tags'), 'tags')
+            db.insert_parquet(sc.parquet_path('posts_tags'), 'posts_tags')
 
-    # Stop Spark Session
-    sc.stop()
+            # Build indices once after bulk insert
+            sql.PostsTags(db).create_indices()
+    finally:
+        db.close()
 
     print('Data Loaded Successfully!')
 
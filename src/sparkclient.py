@@ -1,4 +1,6 @@
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import pyspark.sql.functions as f
@@ -6,6 +8,7 @@ from pydeequ import deequ_maven_coord, f2j_maven_coord
 from pydeequ.checks import Check, CheckLevel
 from pydeequ.suggestions import DEFAULT, ConstraintSuggestionRunner
 from pydeequ.verification import VerificationResult, VerificationSuite
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
 
 
@@ -25,11 +28,20 @@ class SparkClient:
         self.path = path
         self.packages = ['com.databricks:spark-xml_2.12:0.12.0', deequ_maven_coord]
         os.environ['PYSPARK_SUBMIT_ARGS'] = f'--packages {",".join(self.packages)} pyspark-shell'
+        # Map Python threads to JVM threads so scheduler pools can be set per thread
+        os.environ['PYSPARK_PIN_THREAD'] = 'true'
         self.spark = (
             SparkSession.builder
             .appName(app_name)
             .master("local[*]")
             .config("spark.jars.excludes", f2j_maven_coord)
+            # Use Arrow for toPandas() conversion
+            .config("spark.sql.execution.arrow.pyspark.enabled", "true")
+            # XML timestamps have no offset. Using UTC keeps their wall-clock values when Parquet
+            # INT96 timestamps (always UTC) are read without Spark, e.g. by Database.insert_parquet()
+            .config("spark.sql.session.timeZone", "UTC")
+            # Share resources between jobs submitted concurrently, see run_concurrently()
+            .config("spark.scheduler.mode", "FAIR")
             .getOrCreate()
         )
 
@@ -45,6 +57,26 @@ class SparkClient:
         finally:
             self.spark.stop()
 
+    def run_concurrently(self, *funcs):
+        """
+        Runs functions triggering independent Spark jobs in parallel threads.
+        Each function is assigned its own FAIR scheduler pool.
+
+        Parameters:
+        funcs (callable):  Functions without arguments
+
+        Returns
+        -------
+        list               Function results in the same order as functions
+        """
+        def run(pool, func):
+            self.spark.sparkContext.setLocalProperty('spark.scheduler.pool', pool)
+            return func()
+
+        with ThreadPoolExecutor(max_workers=len(funcs)) as executor:
+            futures = [executor.submit(run, f'pool{i}', func) for i, func in enumerate(funcs)]
+            return [future.result() for future in futures]
+
     def parse_xml(self, url, root_tag, row_tag, mode='FAILFAST'):
         """
         Loads XML into Spark DataFrame using spark-xml library
@@ -70,10 +102,44 @@ class SparkClient:
         )
 
         # Remove "_" prefix from columns
-        new_column_names = [c[1:] for c in df.columns]
-        df = df.toDF(*new_column_names)
+        df = df.select(*[f.col(c).alias(c[1:] if c.startswith('_') else c) for c in df.columns])
         return df
 
+    def xml_to_parquet(self, url, root_tag, row_tag, name):
+        """
+        Loads XML into Spark DataFrame via Parquet cache. Parquet file is read if it was
+        written successfully from XML file with the same size and modification time,
+        otherwise XML is parsed and stored in Parquet file.
+
+        Parameters:
+        url (string):      XML file path
+        root_tag (string): Root tag for XML file
+        row_tag (string):  Row tag for data
+        name (string):     Parquet filename
+
+        Returns
+        -------
+        DataFrame          Spark Dataframe with XML data
+        """
+        out = self.parquet_path(name)
+        # Spark creates _SUCCESS marker only when write has completed. Comparing mtime with
+        # Parquet file is not enough as tar restores archived mtime of fetched XML files.
+        success = out + os.sep + '_SUCCESS'
+        source = out + os.sep + '_SOURCE'
+        stat = os.stat(url)
+        source_info = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+        cached_info = None
+        if os.path.exists(success) and os.path.exists(source):
+            with open(source) as fp:
+                cached_info = json.load(fp)
+
+        if cached_info != source_info:
+            self.write_parquet(self.parse_xml(url, root_tag, row_tag), name)
+            with open(source, 'w') as fp:
+                json.dump(source_info, fp)
+        return self.spark.read.parquet(out)
+
     def suggest_constraints(self, df):
         """
         Generate suggested validation checks based on Spark DataFrame data using Pydeequ.
@@ -90,8 +156,8 @@ class SparkClient:
         )
 
         # Print suggested constraints
-        for i, r in pd.json_normalize(suggestion_result['constraint_suggestions'])[['code_for_constraint']].iterrows():
-            print(r['code_for_constraint'])
+        codes = pd.json_normalize(suggestion_result['constraint_suggestions'])['code_for_constraint'].tolist()
+        print('\n'.join(codes))
 
     def check_result_to_df(self, check_result):
         """
@@ -106,6 +172,19 @@ class SparkClient:
         """
         return VerificationResult.checkResultsAsDataFrame(self.spark, check_result)
 
+    def parquet_path(self, name):
+        """
+        Returns Parquet file path using path set for SparkClient
+
+        Parameters:
+        name (string):  Filename
+
+        Returns
+        -------
+        string          Parquet file path
+        """
+        return self.path + os.sep + name + '.parquet'
+
     def write_parquet(self, df, name):
         """
         Stores DataFrame in Parquet file using path set for SparkClient
@@ -114,7 +193,10 @@ class SparkClient:
         df (string):    Spark DataFrame
         name (string):  Filename
         """
-        df.write.mode('overwrite').parquet(self.path + os.sep + name + '.parquet')
+        # Reduce number of output files to avoid tiny file overhead for readers
+        df = df.coalesce(max(1, df.rdd.getNumPartitions() // 4))
+
+        df.write.mode('overwrite').parquet(self.parquet_path(name))
 
 
 class Posts:
@@ -132,7 +214,12 @@ class Posts:
         """
         self.sc = sc
         self.spark = sc.spark
-        self.df = sc.parse_xml(self.sc.path + os.sep + xml, 'posts', 'row')
+        # Posts are stored in Parquet file when XML is parsed
+        self.df = sc.xml_to_parquet(self.sc.path + os.sep + xml, 'posts', 'row', 'posts')
+
+        # Cache loaded data as it is reused by checks and joins
+        self.df = self.df.persist(StorageLevel.MEMORY_AND_DISK)
+        self.df.count()
 
     def check(self):
         """
@@ -180,12 +267,6 @@ class Posts:
 
         return self.sc.check_result_to_df(check_result)
 
-    def save(self):
-        """
-        Stores Posts in Parquet file
-        """
-        self.sc.write_parquet(self.df, 'posts')
-
 
 class Tags:
     """
@@ -202,7 +283,12 @@ class Tags:
         """
         self.sc = sc
         self.spark = sc.spark
-        self.df = sc.parse_xml(self.sc.path + os.sep + xml, 'tags', 'row')
+        # Tags are stored in Parquet file when XML is parsed
+        self.df = sc.xml_to_parquet(self.sc.path + os.sep + xml, 'tags', 'row', 'tags')
+
+        # Cache loaded data as it is reused by checks and joins
+        self.df = self.df.persist(StorageLevel.MEMORY_AND_DISK)
+        self.df.count()
 
     def check(self):
         """
@@ -236,12 +322,6 @@ class Tags:
 
         return self.sc.check_result_to_df(check_result)
 
-    def save(self):
-        """
-        Stores Tags in Parquet file
-        """
-        self.sc.write_parquet(self.df, 'tags')
-
 
 class PostsTags:
     """
@@ -266,18 +346,22 @@ class PostsTags:
         """
         self.sc = sc
         self.spark = sc.spark
+        # Split Tags string (e.g. "<tag1><tag2>") into one row per distinct tag name
+        posts_tokens = posts_df.select(
+            f.col('Id').alias('PostId'),
+            f.explode(f.array_distinct(
+                f.split(f.regexp_replace('Tags', '^<|>$', ''), '><')
+            )).alias('TagName')
+        )
+
+        # Tags dataset is small so it is broadcast to avoid shuffling posts
         self.df = (
-            posts_df.alias('p')
-            .join(
-                tags_df.alias('t'),
-                f.col('p.Tags').contains(
-                    f.concat(f.lit('<'), f.col('t.TagName'), f.lit('>'))),
-                how='inner'
-            )
+            posts_tokens
+            .join(f.broadcast(tags_df.select('Id', 'TagName')), 'TagName', how='inner')
             .select(
-                f.col('p.Id').alias('PostId'),
-                f.col('t.Id').alias('TagId'),
-                't.TagName'
+                'PostId',
+                f.col('Id').alias('TagId'),
+                'TagName'
             )
         )
 
@@ -1,5 +1,9 @@
 import os
 
+import pandas as pd
+import pyarrow.dataset as ds
+import pyspark.sql.functions as f
+
 import sparkclient as scl
 
 sc = None
@@ -20,12 +24,57 @@ def test_sparkclient():
     assert sc.spark.version == '3.0.3'
 
 
+def test_parquet_timestamps():
+    assert sc.spark.conf.get('spark.sql.session.timeZone') == 'UTC'
+    df = sc.spark.createDataFrame([('2020-01-01T10:00:00.500',)], ['d']).select(f.to_timestamp('d').alias('d'))
+    sc.write_parquet(df, 'test_timestamps')
+    values = ds.dataset(sc.parquet_path('test_timestamps')).to_table().column('d').to_pylist()
+    assert values == [pd.Timestamp('2020-01-01 10:00:00.5')]
+
+
+def test_run_concurrently():
+    assert sc.run_concurrently(lambda: 1, lambda: sc.spark.range(10).count()) == [1, 10]
+
+
 def test_parse_xml():
     df = sc.parse_xml(sc.path + os.sep + 'Tags.xml', 'tags', 'row').toPandas()
     assert len(df) == 991
     assert list(df.columns) == ['Count', 'ExcerptPostId', 'Id', 'TagName', 'WikiPostId']
 
 
+def test_xml_to_parquet():
+    success = sc.parquet_path('tags_xml') + os.sep + '_SUCCESS'
+    df = sc.xml_to_parquet(sc.path + os.sep + 'Tags.xml', 'tags', 'row', 'tags_xml')
+    assert os.path.exists(success)
+    assert df.count() == 991
+    assert df.columns == ['Count', 'ExcerptPostId', 'Id', 'TagName', 'WikiPostId']
+
+    # Incomplete output is parsed again
+    os.remove(success)
+    df = sc.xml_to_parquet(sc.path + os.sep + 'Tags.xml', 'tags', 'row', 'tags_xml')
+    assert os.path.exists(success)
+    assert df.count() == 991
+
+
+def test_xml_to_parquet_changed_xml():
+    xml = sc.path + os.sep + 'test_tags.xml'
+    with open(xml, 'w') as fp:
+        fp.write('<tags><row Id="1" TagName="a" /></tags>')
+    assert sc.xml_to_parquet(xml, 'tags', 'row', 'test_tags').count() == 1
+
+    # XML with older mtime (e.g. extracted by tar) is still parsed again
+    with open(xml, 'w') as fp:
+        fp.write('<tags><row Id="1" TagName="a" /><row Id="2" TagName="b" /></tags>')
+    os.utime(xml, (0, 0))
+    assert sc.xml_to_parquet(xml, 'tags', 'row', 'test_tags').count() == 2
+
+    # Unchanged XML is read from Parquet file
+    success = sc.parquet_path('test_tags') + os.sep + '_SUCCESS'
+    written = os.stat(success).st_mtime_ns
+    assert sc.xml_to_parquet(xml, 'tags', 'row', 'test_tags').count() == 2
+    assert os.stat(success).st_mtime_ns == written
+
+
 def test_posts():
     posts = scl.Posts(sc, 'Posts.xml')
     assert posts.df.count() == 20707